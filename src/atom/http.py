@@ -29,6 +29,10 @@ different mechanism for making HTTP requests.
   ProxiedHttpClient: Contains a request method which connects to a proxy using
       settings stored in operating system environment variables then 
       performs an HTTP call to the endpoint server.
+
+  PersistentHttpClient: A ProxiedHttpClient which keeps connections open
+      between requests so that consecutive calls to the same host reuse the
+      TCP (and SSL) connection.
 """
 
 
@@ -38,6 +42,8 @@ __author__ = 'api.jscudder (Jeff Scudder)'
 
 import types
 import os
+import threading
+import weakref
 import six.moves.http_client
 import atom.url
 import atom.http_interface
@@ -282,6 +288,154 @@ class ProxiedHttpClient(HttpClient):
     return url.to_string()
 
 
+class PersistentHttpClient(ProxiedHttpClient):
+  """Performs HTTP requests over kept-alive connections.
+
+  Connections to hosts which are not reached through a proxy are cached per
+  thread, keyed on the protocol, host, and port, so that later requests skip
+  the TCP and SSL handshakes. A connection is only reused once the last
+  response received on it has been read completely; otherwise it is closed
+  and a new connection is opened.
+
+  Connections opened by a thread are closed when that thread exits. Call
+  close to release all of the open connections.
+  """
+
+  def __init__(self, headers=None):
+    ProxiedHttpClient.__init__(self, headers=headers)
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    # Only the owning thread's local storage keeps a connection alive.
+    self._all_connections = weakref.WeakSet()
+
+  def _get_connections(self):
+    connections = getattr(self._local, 'connections', None)
+    if connections is None:
+      connections = {}
+      self._local.connections = connections
+    return connections
+
+  def _get_responses(self):
+    responses = getattr(self._local, 'responses', None)
+    if responses is None:
+      responses = {}
+      self._local.responses = responses
+    return responses
+
+  def request(self, operation, url, data=None, headers=None):
+    """Performs an HTTP call, retrying once if a cached connection is stale.
+
+    The server may close an idle connection at any time, so if a reused
+    connection fails the request is sent again on a fresh connection. The
+    retry is only attempted for idempotent methods, since the server may
+    already have acted on the first request, and only when the request body
+    can be sent a second time.
+    """
+    if isinstance(url, (str,)):
+      url = atom.url.parse_url(url)
+    key = None
+    if isinstance(url, atom.url.Url):
+      key = (url.protocol, url.host, url.port)
+    reused = key is not None and key in self._get_connections()
+    try:
+      response = ProxiedHttpClient.request(self, operation, url, data=data,
+          headers=headers)
+    except (six.moves.http_client.HTTPException, socket.error):
+      # The connection is in an unknown state, so never reuse it.
+      self._drop_connection(key)
+      if (not reused or operation not in _IDEMPOTENT_METHODS
+          or not _is_replayable(data)):
+        raise
+      response = ProxiedHttpClient.request(self, operation, url, data=data,
+          headers=headers)
+    if key in self._get_connections():
+      self._get_responses()[key] = response
+    return response
+
+  def _prepare_connection(self, url, headers):
+    if os.environ.get('%s_proxy' % url.protocol):
+      # Tunnelled connections cannot be reopened transparently by httplib.
+      return ProxiedHttpClient._prepare_connection(self, url, headers)
+    connections = self._get_connections()
+    key = (url.protocol, url.host, url.port)
+    connection = connections.get(key)
+    if connection is not None and not self._is_idle(key, connection):
+      self._drop_connection(key)
+      connection = None
+    if connection is None:
+      connection = ProxiedHttpClient._prepare_connection(self, url, headers)
+      connections[key] = connection
+      self._lock.acquire()
+      try:
+        self._all_connections.add(connection)
+      finally:
+        self._lock.release()
+    return connection
+
+  def _is_idle(self, key, connection):
+    """Returns True if a new request can be sent on the cached connection."""
+    response = self._get_responses().get(key)
+    if response is not None and not _is_fully_read(response):
+      return False
+    state = getattr(connection, '_HTTPConnection__state',
+                    six.moves.http_client._CS_IDLE)
+    return state == six.moves.http_client._CS_IDLE
+
+  def _drop_connection(self, key):
+    self._get_responses().pop(key, None)
+    connection = self._get_connections().pop(key, None)
+    if connection is not None:
+      connection.close()
+      self._lock.acquire()
+      try:
+        self._all_connections.discard(connection)
+      finally:
+        self._lock.release()
+
+  def close(self):
+    """Closes every connection opened by this client, on all threads."""
+    self._lock.acquire()
+    try:
+      connections = list(self._all_connections)
+      self._all_connections = weakref.WeakSet()
+    finally:
+      self._lock.release()
+    for connection in connections:
+      connection.close()
+    self._local = threading.local()
+
+
+# Methods which may be sent again after a failure without changing the
+# outcome of the first attempt.
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE'))
+
+
+def _is_fully_read(response):
+  """Returns False if the response still has unread bytes on its socket.
+
+  A response which was closed before its body was read to the end leaves the
+  rest of the body on the connection, so the connection cannot be reused.
+  """
+  if not response.isclosed():
+    return False
+  # httplib counts down the bytes left in the body, or in the current chunk.
+  if getattr(response, 'length', None):
+    return False
+  return not (getattr(response, 'chunked', False) and
+              getattr(response, 'chunk_left', None) is not None)
+
+
+def _is_replayable(data):
+  if data is None or isinstance(data, (str, bytes)):
+    return True
+  if isinstance(data, list):
+    for data_part in data:
+      if not isinstance(data_part, (str, bytes)):
+        return False
+    return True
+  return False
+
+
 def _get_proxy_auth(proxy_settings):
   """Returns proxy authentication string for header.
 
@@ -352,7 +506,7 @@ def _send_data_part(data, connection):
     # Read the file and send it a chunk at a time.
     while 1:
       binarydata = data.read(100000)
-      if binarydata == '': break
+      if not binarydata: break
       connection.send(binarydata)
     return
   else:
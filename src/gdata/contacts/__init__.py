@@ -20,6 +20,8 @@ from __future__ import absolute_import
 __author__ = 'dbrattli (Dag Brattli)'
 
 
+import io
+import six
 import atom
 import gdata
 
@@ -652,6 +654,12 @@ def ContactsFeedFromString(xml_string):
   return atom.CreateClassFromXMLString(ContactsFeed, xml_string)
 
 
+def StreamingContactsFeedFromString(xml_string):
+  """Parses a ContactsFeed one entry at a time, see _StreamingFeedFromString.
+  """
+  return _StreamingFeedFromString(ContactsFeed, xml_string)
+
+
 class GroupEntry(gdata.BatchEntry):
   """Represents a contact group."""
   _children = gdata.BatchEntry._children.copy()
@@ -739,3 +747,55 @@ def ProfilesFeedFromString(xml_string):
     A ProfilesFeed object corresponding to the given XML.
   """
   return atom.CreateClassFromXMLString(ProfilesFeed, xml_string)
+
+
+def StreamingProfilesFeedFromString(xml_string):
+  """Converts an XML string into a ProfilesFeed, one entry at a time.
+
+  Args:
+    xml_string: string The XML describing a Profiles feed.
+
+  Returns:
+    A ProfilesFeed object corresponding to the given XML.
+  """
+  return _StreamingFeedFromString(ProfilesFeed, xml_string)
+
+
+def _StreamingFeedFromString(feed_class, xml_string):
+  """Creates a feed from XML without building the tree of the whole feed.
+
+  Each entry is converted as soon as its closing tag has been parsed and
+  is then removed from the tree, so only one entry's elements are held in
+  memory at a time. Uses the same ElementTree module as atom, so the
+  result matches that of the non-streaming converters.
+
+  Args:
+    feed_class: class The feed class to create, for example ContactsFeed.
+    xml_string: str The XML of the feed.
+
+  Returns:
+    An instance of feed_class, or None if the root element of the XML did
+    not match the feed class.
+  """
+  entry_tag = '{%s}entry' % atom.ATOM_NAMESPACE
+  entry_class = feed_class._children[entry_tag][1][0]
+  if isinstance(xml_string, six.text_type):
+    xml_string = xml_string.encode(atom.XML_STRING_ENCODING)
+  root = None
+  depth = 0
+  entries = []
+  for event, element in atom.ElementTree.iterparse(io.BytesIO(xml_string),
+                                                   events=('start', 'end')):
+    if event == 'start':
+      if root is None:
+        root = element
+      depth += 1
+      continue
+    depth -= 1
+    if depth == 1 and element.tag == entry_tag:
+      entries.append(atom._CreateClassFromElementTree(entry_class, element))
+      root.remove(element)
+  feed = atom._CreateClassFromElementTree(feed_class, root)
+  if feed is not None:
+    feed.entry = entries
+  return feed
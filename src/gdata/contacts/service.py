@@ -28,8 +28,16 @@ from __future__ import absolute_import
 __author__ = 'dbrattli (Dag Brattli)'
 
 
+import calendar
+import collections
+import email.utils
+import sys
+import time
+import threading
+import six.moves.queue
+import atom.http
+import atom.service
 import gdata
-import gdata.calendar
 import gdata.service
 
 
@@ -40,6 +48,50 @@ DEFAULT_PROFILES_BATCH_URL = ('http://www.google.com'
 
 GDATA_VER_HEADER = 'GData-Version'
 
+# str.removeprefix was added in Python 3.9.
+_HAS_REMOVEPREFIX = sys.version_info >= (3, 9)
+
+_DEFAULT_CONTACTS_FEED = '/m8/feeds/contacts/default/full'
+_DEFAULT_GROUPS_FEED = '/m8/feeds/groups/default/full'
+_DEFAULT_PROFILES_FEED = '/m8/feeds/profiles/default/full'
+
+# The maximum number of operations the server accepts in one batch request.
+BATCH_MAX = 100
+
+# The number of bytes GetPhotoStream reads and writes at a time.
+PHOTO_CHUNK_SIZE = 32768
+
+# The number of entries remembered by GetContact and GetProfile.
+ENTRY_CACHE_MAX = 1024
+
+# The number of feeds remembered by GetContactsFeed and GetProfilesFeed.
+FEED_CACHE_MAX = 16
+
+# The gd:etag attribute of a feed's root element.
+_GD_ETAG = '{%s}etag' % gdata.GDATA_NAMESPACE
+
+# The number of feed URIs remembered by ContactsService.GetFeedUri.
+_FEED_URI_CACHE_MAX = 256
+
+
+def _Text(value):
+  """Returns value as a str; atom keeps parsed XML text as bytes on Python 3."""
+  if not isinstance(value, str) and isinstance(value, bytes):
+    return value.decode('utf-8')
+  return value
+
+
+def _HttpDate(timestamp):
+  """Converts a UTC atom:updated timestamp to an HTTP date, or None."""
+  timestamp = _Text(timestamp)
+  if not timestamp or not timestamp.endswith('Z'):
+    return None
+  try:
+    parsed = time.strptime(timestamp[:19], '%Y-%m-%dT%H:%M:%S')
+  except ValueError:
+    return None
+  return email.utils.formatdate(calendar.timegm(parsed), usegmt=True)
+
 
 class Error(Exception):
   pass
@@ -52,6 +104,9 @@ class RequestError(Error):
 class ContactsService(gdata.service.GDataService):
   """Client for the Google Contacts service."""
 
+  # No __slots__: GDataService, Query and Exception instances all have a
+  # __dict__, so slots on these subclasses would not make them smaller.
+
   def __init__(self, email=None, password=None, source=None,
                server='www.google.com', additional_headers=None,
                contact_list='default', **kwargs):
@@ -68,14 +123,29 @@ class ContactsService(gdata.service.GDataService):
           use when no URI is specified to the methods of the service.
           Default value: 'default' (the logged in user's contact list).
       **kwargs: The other parameters to pass to gdata.service.GDataService
-          constructor.
+          constructor. If no http_client is given, an
+          atom.http.PersistentHttpClient is used so that consecutive
+          requests reuse the same connection.
     """
 
+    self._feed_uri_cache = {}
+    self._entry_cache = collections.OrderedDict()
+    # Maps the clean edit URL of each cached entry to its cache key.
+    self._entry_keys = {}
+    self._feed_meta = collections.OrderedDict()
     self.contact_list = contact_list
+    if kwargs.get('http_client') is None:
+      kwargs['http_client'] = atom.http.PersistentHttpClient()
     gdata.service.GDataService.__init__(
         self, email=email, password=password, service='cp', source=source,
         server=server, additional_headers=additional_headers, **kwargs)
 
+  def close(self):
+    """Closes any connections kept open by the service's http_client."""
+    close = getattr(self.http_client, 'close', None)
+    if close is not None:
+      close()
+
   def GetFeedUri(self, kind='contacts', contact_list=None, projection='full',
                  scheme=None):
     """Builds a feed URI.
@@ -94,23 +164,211 @@ class ContactsService(gdata.service.GDataService):
       A feed URI using the given kind, contact list, and projection.
       Example: '/m8/feeds/contacts/default/full'.
     """
-    contact_list = contact_list or self.contact_list
+    if contact_list is None:
+      contact_list = self.contact_list
+    key = (kind, contact_list, projection, scheme)
+    uri = self._feed_uri_cache.get(key)
+    if uri is None:
+      if len(self._feed_uri_cache) >= _FEED_URI_CACHE_MAX:
+        self._feed_uri_cache.clear()
+      uri = self._BuildFeedUri(*key)
+      self._feed_uri_cache[key] = uri
+    return uri
+
+  def _BuildFeedUri(self, kind, contact_list, projection, scheme):
     if kind == 'profiles':
-      contact_list = 'domain/%s' % contact_list
-    prefix = scheme and '%s://%s' % (scheme, self.server) or ''
-    return '%s/m8/feeds/%s/%s/%s' % (prefix, kind, contact_list, projection)
+      contact_list = 'domain/' + contact_list
+    path = '/'.join(('/m8/feeds', kind, contact_list, projection))
+    if scheme:
+      return scheme + '://' + self.server + path
+    return path
+
+  def _GetServer(self):
+    return self.__server
+
+  def _SetServer(self, server):
+    # Cached feed URIs which include a scheme also include the server name.
+    self.__server = server
+    self._feed_uri_cache.clear()
+    # AtomService.__init__ sets the server to None before GDataService sets
+    # the real one.
+    self._url_prefix = 'http://' + str(server)
+    self._url_prefix_len = len(self._url_prefix)
+
+  server = property(_GetServer, _SetServer,
+      doc='The name of the server to which requests are sent.')
+
+  def GetContactsFeed(self, uri=None, streaming=False):
+    """Retrieves a feed of contacts.
+
+    Feeds which carry a gd:etag are kept in a cache of the FEED_CACHE_MAX
+    most recently used feeds. When the same URI is requested again, the
+    request includes If-None-Match and If-Modified-Since headers. If the
+    server responds with 304 Not Modified, the feed object returned by the
+    earlier call is returned again. It is the same object, not a copy, so
+    changes the caller made to it are visible in the result.
+
+    Args:
+      uri: string (optional) the URL to retrieve the contacts feed from.
+          Default value: the feed of self.contact_list.
+      streaming: boolean (optional) If true, the feed is parsed one entry at
+          a time using gdata.contacts.StreamingContactsFeedFromString, which
+          uses less memory for large feeds. Streamed feeds are not cached.
+
+    Returns:
+      On success, a ContactsFeed containing the contacts.
+      On failure, raises a RequestError.
+    """
+    uri = uri or self.GetFeedUri()
+    if streaming:
+      return self.Get(uri,
+                      converter=gdata.contacts.StreamingContactsFeedFromString)
+    return self._GetCachedFeed(uri, gdata.contacts.ContactsFeedFromString)
 
-  def GetContactsFeed(self, uri=None):
+  def IterContacts(self, uri=None, page_size=1000):
+    """Yields each contact in a contacts feed, one page at a time.
+
+    The pages are fetched by following the feed's next links and parsed with
+    the streaming converter, so only page_size contacts are held in memory
+    at once no matter how long the feed is.
+
+    Args:
+      uri: string (optional) the URL of the first page of the feed.
+          Default value: the feed of self.contact_list.
+      page_size: int (optional) The number of contacts to request per page
+          if uri does not already specify max-results. Default value: 1000.
+
+    Yields:
+      gdata.contacts.ContactEntry objects.
+    """
     uri = uri or self.GetFeedUri()
-    return self.Get(uri, converter=gdata.contacts.ContactsFeedFromString)
+    if page_size and uri.find('max-results=') < 0:
+      uri = atom.service.BuildUri(uri, {'max-results': str(page_size)})
+    while uri:
+      feed = self.GetContactsFeed(uri, streaming=True)
+      for entry in feed.entry:
+        yield entry
+      next_link = feed.GetNextLink()
+      uri = next_link and next_link.href
+      feed = None
 
   def GetContact(self, uri):
-    return self.Get(uri, converter=gdata.contacts.ContactEntryFromString)
+    """Retrieves a contact, reusing the cached copy if it is unchanged.
+
+    Entries which carry an ETag are kept in a cache of the ENTRY_CACHE_MAX
+    most recently used entries. When the same URI is requested again, the
+    request includes an If-None-Match header and the cached entry is
+    returned if the server responds with 304 Not Modified.
+
+    Args:
+      uri: string the URL of the contact entry.
+
+    Returns:
+      On success, a ContactEntry.
+      On failure, raises a RequestError.
+    """
+    return self._GetCachedEntry(uri, gdata.contacts.ContactEntryFromString)
+
+  def InvalidateCache(self, uri=None):
+    """Removes entries and feeds from the caches used by the Get methods.
+
+    Args:
+      uri: string (optional) The URL, or edit URL, of the entry to remove.
+          Cached feeds containing the entry are removed as well. If
+          omitted, the whole cache is cleared.
+    """
+    if uri is None:
+      self._entry_cache.clear()
+      self._entry_keys.clear()
+      self._feed_meta.clear()
+      return
+    uri = self._CleanUri(uri)
+    self._InvalidateFeeds(uri)
+    self._DropCachedEntry(uri)
+    key = self._entry_keys.get(uri)
+    if key is not None:
+      self._DropCachedEntry(key)
+
+  def _DropCachedEntry(self, key):
+    cached = self._entry_cache.pop(key, None)
+    if cached is not None and self._entry_keys.get(cached[2]) == key:
+      del self._entry_keys[cached[2]]
+
+  def _GetCachedEntry(self, uri, converter):
+    key = self._CleanUri(uri)
+    cached = self._entry_cache.get(key)
+    extra_headers = None
+    if cached is not None:
+      extra_headers = {'If-None-Match': cached[0]}
+    try:
+      entry = self.Get(uri, extra_headers=extra_headers, converter=converter)
+    except gdata.service.RequestError as e:
+      if cached is not None and e.args[0]['status'] == 304:
+        # Mark the entry as most recently used.
+        del self._entry_cache[key]
+        self._entry_cache[key] = cached
+        return cached[1]
+      raise
+    self._DropCachedEntry(key)
+    if getattr(entry, 'etag', None):
+      if len(self._entry_cache) >= ENTRY_CACHE_MAX:
+        self._DropCachedEntry(next(iter(self._entry_cache)))
+      edit_uri = None
+      edit_link = entry.GetEditLink()
+      if edit_link is not None:
+        edit_uri = self._CleanUri(edit_link.href)
+        self._entry_keys[edit_uri] = key
+      self._entry_cache[key] = (_Text(entry.etag), entry, edit_uri)
+    return entry
+
+  def _GetCachedFeed(self, uri, converter):
+    # Get does not expose the response headers, so the validators are taken
+    # from the feed itself: its gd:etag attribute and its atom:updated time.
+    key = self._CleanUri(uri)
+    cached = self._feed_meta.get(key)
+    extra_headers = None
+    if cached is not None:
+      extra_headers = {'If-None-Match': cached[0]}
+      if cached[1]:
+        extra_headers['If-Modified-Since'] = cached[1]
+    try:
+      feed = self.Get(uri, extra_headers=extra_headers, converter=converter)
+    except gdata.service.RequestError as e:
+      if cached is not None and e.args[0]['status'] == 304:
+        # Mark the feed as most recently used.
+        del self._feed_meta[key]
+        self._feed_meta[key] = cached
+        return cached[2]
+      raise
+    self._feed_meta.pop(key, None)
+    # Every feed has an atom:updated time, so only feeds with a gd:etag are
+    # kept; the others would fill the cache without any version to check.
+    etag = feed is not None and _Text(feed.extension_attributes.get(_GD_ETAG))
+    if etag:
+      if len(self._feed_meta) >= FEED_CACHE_MAX:
+        self._feed_meta.popitem(last=False)
+      last_modified = _HttpDate(feed.updated and feed.updated.text)
+      self._feed_meta[key] = (etag, last_modified, feed)
+    return feed
+
+  def _InvalidateFeeds(self, uri):
+    """Removes the cached feeds which uri was fetched from or posted to.
+
+    Args:
+      uri: string A clean entry, insert or batch URL.
+    """
+    for key in list(self._feed_meta):
+      feed_uri = key.split('?', 1)[0]
+      if uri == feed_uri or uri.startswith(feed_uri + '/'):
+        del self._feed_meta[key]
 
   def CreateContact(self, new_contact, insert_uri=None, url_params=None,
                     escape_params=True):
     """Adds an new contact to Google Contacts.
 
+    To add many contacts, use CreateContacts which sends them in batch
+    requests instead of making one HTTP request per contact.
+
     Args:
       new_contact: atom.Entry or subclass A new contact which is to be added to
                 Google Contacts.
@@ -128,6 +386,7 @@ class ContactsService(gdata.service.GDataService):
          'body': HTTP body of the server's response}
     """
     insert_uri = insert_uri or self.GetFeedUri()
+    self._InvalidateFeeds(self._CleanUri(insert_uri))
     return self.Post(new_contact, insert_uri, url_params=url_params,
                      escape_params=escape_params,
                      converter=gdata.contacts.ContactEntryFromString)
@@ -136,6 +395,9 @@ class ContactsService(gdata.service.GDataService):
                     escape_params=True):
     """Updates an existing contact.
 
+    To update many contacts, use UpdateContacts which sends them in batch
+    requests instead of making one HTTP request per contact.
+
     Args:
       edit_uri: string The edit link URI for the element being updated
       updated_contact: string, atom.Entry or subclass containing
@@ -154,6 +416,7 @@ class ContactsService(gdata.service.GDataService):
          'reason': HTTP reason from the server,
          'body': HTTP body of the server's response}
     """
+    self.InvalidateCache(edit_uri)
     return self.Put(updated_contact, self._CleanUri(edit_uri),
                     url_params=url_params,
                     escape_params=escape_params,
@@ -163,6 +426,9 @@ class ContactsService(gdata.service.GDataService):
       url_params=None, escape_params=True):
     """Removes an contact with the specified ID from Google Contacts.
 
+    To remove many contacts, use DeleteContacts which sends them in batch
+    requests instead of making one HTTP request per contact.
+
     Args:
       edit_uri: string The edit URL of the entry to be deleted. Example:
                '/m8/feeds/contacts/default/full/xxx/yyy'
@@ -179,9 +445,95 @@ class ContactsService(gdata.service.GDataService):
          'reason': HTTP reason from the server,
          'body': HTTP body of the server's response}
     """
+    self.InvalidateCache(edit_uri)
     return self.Delete(self._CleanUri(edit_uri),
                        url_params=url_params, escape_params=escape_params)
 
+  def CreateContacts(self, new_contacts, batch_url=None):
+    """Adds many contacts using as few batch requests as possible.
+
+    Args:
+      new_contacts: list of gdata.contacts.ContactEntry The contacts to add.
+      batch_url: string (optional) The batch URL to post the requests to.
+          Default value: the batch URL of self.contact_list.
+
+    Returns:
+      A ContactsFeed holding the result entries of all of the batch requests.
+    """
+    return self._ExecuteBatchOperation(new_contacts, gdata.BATCH_INSERT,
+                                       batch_url)
+
+  def UpdateContacts(self, updated_contacts, batch_url=None):
+    """Updates many contacts using as few batch requests as possible.
+
+    Args:
+      updated_contacts: list of gdata.contacts.ContactEntry The contacts to
+          update, each with a valid atom id.
+      batch_url: string (optional) The batch URL to post the requests to.
+          Default value: the batch URL of self.contact_list.
+
+    Returns:
+      A ContactsFeed holding the result entries of all of the batch requests.
+    """
+    return self._ExecuteBatchOperation(updated_contacts, gdata.BATCH_UPDATE,
+                                       batch_url)
+
+  def DeleteContacts(self, contacts, batch_url=None):
+    """Removes many contacts using as few batch requests as possible.
+
+    Args:
+      contacts: list of gdata.contacts.ContactEntry or strings The contacts
+          to delete, or the atom ids of the contacts to delete.
+      batch_url: string (optional) The batch URL to post the requests to.
+          Default value: the batch URL of self.contact_list.
+
+    Returns:
+      A ContactsFeed holding the result entries of all of the batch requests.
+    """
+    return self._ExecuteBatchOperation(contacts, gdata.BATCH_DELETE,
+                                       batch_url)
+
+  def _BuildBatchFeeds(self, entries, operation):
+    """Splits entries into batch request feeds of at most BATCH_MAX entries.
+
+    Entries without a batch id are given their index in the entries list so
+    that batch ids are unique across all of the generated feeds.
+
+    Args:
+      entries: list of entries or atom id strings to include in the feeds.
+      operation: string The batch operation, for example gdata.BATCH_INSERT.
+
+    Returns:
+      A list of gdata.contacts.ContactsFeed objects.
+    """
+    feeds = []
+    for index, entry in enumerate(entries):
+      if index % BATCH_MAX == 0:
+        feeds.append(gdata.contacts.ContactsFeed())
+      if isinstance(entry, (str,)):
+        feeds[-1].AddBatchEntry(id_url_string=entry,
+                                batch_id_string=str(index),
+                                operation_string=operation)
+      else:
+        batch_id_string = None
+        if entry.batch_id is None or entry.batch_id.text is None:
+          batch_id_string = str(index)
+        feeds[-1].AddBatchEntry(entry=entry, batch_id_string=batch_id_string,
+                                operation_string=operation)
+    return feeds
+
+  def _ExecuteBatchOperation(self, entries, operation, batch_url=None):
+    batch_url = batch_url or self.GetFeedUri(projection='full/batch',
+                                             scheme='http')
+    if operation != gdata.BATCH_INSERT:
+      # Batch entries are identified by atom id rather than by the URL they
+      # were fetched from, so drop every cached entry.
+      self.InvalidateCache()
+    result = gdata.contacts.ContactsFeed()
+    for batch_feed in self._BuildBatchFeeds(entries, operation):
+      result.entry.extend(self.ExecuteBatch(batch_feed, batch_url).entry)
+    return result
+
   def GetGroupsFeed(self, uri=None):
     uri = uri or self.GetFeedUri('groups')
     return self.Get(uri, converter=gdata.contacts.GroupsFeedFromString)
@@ -227,11 +579,13 @@ class ContactsService(gdata.service.GDataService):
                       is a filename, the length is determined using
                       os.path.getsize. If media is a MediaSource object, it is
                       assumed that it already contains the content length.
+
+    Raises:
+      Error: contact_entry_or_url is a ContactEntry without a photo edit link.
     """
-    if isinstance(contact_entry_or_url, gdata.contacts.ContactEntry):
-      url = contact_entry_or_url.GetPhotoEditLink().href
-    else:
-      url = contact_entry_or_url
+    url = self._GetPhotoUrl(contact_entry_or_url, 'GetPhotoEditLink')
+    if not url:
+      raise Error('The contact entry has no photo edit link.')
     if isinstance(media, gdata.MediaSource):
       payload = media
     # If the media object is a file-like object, then use it as the file
@@ -254,45 +608,172 @@ class ContactsService(gdata.service.GDataService):
          contain a photo link, the image will not be fetched and this method
          will return None.
     """
-    # TODO: add the ability to write out the binary image data to a file, 
-    # reading and writing a chunk at a time to avoid potentially using up 
-    # large amounts of memory.
-    url = None
-    if isinstance(contact_entry_or_url, gdata.contacts.ContactEntry):
-      photo_link = contact_entry_or_url.GetPhotoLink()
-      if photo_link:
-        url = photo_link.href
-    else:
-      url = contact_entry_or_url
+    # Use GetPhotoStream to write the image to a file a chunk at a time
+    # instead of holding all of it in memory.
+    url = self._GetPhotoUrl(contact_entry_or_url)
     if url:
       return self.Get(url, converter=str)
     else:
       return None
 
+  def GetPhotos(self, contact_entries_or_urls, max_workers=8):
+    """Retrieves many photos at once using a pool of threads.
+
+    Each thread keeps its own connection open when the http_client is an
+    atom.http.PersistentHttpClient, so up to max_workers downloads are in
+    flight at a time.
+
+    Args:
+      contact_entries_or_urls: list of gdata.contacts.ContactEntry objects
+          or photo link URLs, as accepted by GetPhoto.
+      max_workers: int (optional) The number of threads used to download
+          the photos. Default value: 8.
+
+    Yields:
+      (contact_entry_or_url, photo) tuples in the order in which the
+      downloads finish, where photo is the value returned by GetPhoto.
+
+    Raises:
+      ValueError: if max_workers is less than 1.
+      RequestError: if a download fails. The remaining downloads which have
+          not started yet are cancelled.
+    """
+    if max_workers < 1:
+      raise ValueError('max_workers must be greater than 0')
+    return self._GetPhotos(contact_entries_or_urls, max_workers)
+
+  def _GetPhotos(self, contact_entries_or_urls, max_workers):
+    pending = six.moves.queue.Queue()
+    for contact_entry_or_url in contact_entries_or_urls:
+      pending.put(contact_entry_or_url)
+    num_photos = pending.qsize()
+    results = six.moves.queue.Queue()
+
+    def DownloadPhotos():
+      while True:
+        try:
+          contact_entry_or_url = pending.get_nowait()
+        except six.moves.queue.Empty:
+          return
+        try:
+          results.put((contact_entry_or_url,
+                       self.GetPhoto(contact_entry_or_url), None))
+        except Exception as e:
+          results.put((contact_entry_or_url, None, e))
+
+    for i in range(min(max_workers, num_photos)):
+      worker = threading.Thread(target=DownloadPhotos)
+      worker.daemon = True
+      worker.start()
+    try:
+      for i in range(num_photos):
+        contact_entry_or_url, photo, error = results.get()
+        if error is not None:
+          raise error
+        yield contact_entry_or_url, photo
+    finally:
+      # Stop the workers from starting downloads nobody will collect.
+      while True:
+        try:
+          pending.get_nowait()
+        except six.moves.queue.Empty:
+          break
+
+  def GetPhotoStream(self, contact_entry_or_url, file_handle,
+                     chunk_size=PHOTO_CHUNK_SIZE):
+    """Writes the contact's photo to a file, reading a chunk at a time.
+
+    Only chunk_size bytes of the image are held in memory at once, no matter
+    how large the photo is.
+
+    Args:
+      contact_entry_or_url: a gdata.contacts.ContactEntry object or a string
+         containing the photo link's URL. If the contact entry does not
+         contain a photo link, the image will not be fetched and this method
+         will return None.
+      file_handle: A file-like object opened for binary writing.
+      chunk_size: int (optional) The number of bytes to read from the server
+          and write to the file_handle at a time. Default value: 32768.
+
+    Returns:
+      The number of bytes written to the file_handle.
+
+    Raises:
+      RequestError: on error response from server.
+    """
+    url = self._GetPhotoUrl(contact_entry_or_url)
+    if not url:
+      return None
+    server_response = self.request('GET', url)
+    redirects_remaining = 4
+    while server_response.status in (301, 302) and redirects_remaining > 0:
+      body = server_response.read()
+      location = (server_response.getheader('Location')
+                  or server_response.getheader('location'))
+      if location is None:
+        raise gdata.service.RequestError({'status': server_response.status,
+            'reason': '302 received without Location header',
+            'body': body})
+      server_response = self.request('GET', location)
+      redirects_remaining -= 1
+    if server_response.status != 200:
+      raise gdata.service.RequestError({'status': server_response.status,
+                                         'reason': server_response.reason,
+                                         'body': server_response.read()})
+    bytes_written = 0
+    try:
+      while True:
+        chunk = server_response.read(chunk_size)
+        if not chunk:
+          break
+        file_handle.write(chunk)
+        bytes_written += len(chunk)
+    finally:
+      # If a read or write failed, the rest of the photo is never read, so
+      # the response must not hold on to the kept-alive connection.
+      server_response.close()
+    return bytes_written
+
+  def _GetPhotoUrl(self, contact_entry_or_url, link_finder='GetPhotoLink'):
+    """Returns the photo URL of an entry, or the argument if it is a URL.
+
+    Any object with the link_finder method, such as a ContactEntry, is
+    treated as an entry. This avoids an isinstance check on every call.
+    """
+    find_link = getattr(contact_entry_or_url, link_finder, None)
+    if find_link is None:
+      return contact_entry_or_url
+    photo_link = find_link()
+    if photo_link:
+      return photo_link.href
+    return None
+
   def DeletePhoto(self, contact_entry_or_url):
-    url = None
-    if isinstance(contact_entry_or_url, gdata.contacts.ContactEntry):
-      url = contact_entry_or_url.GetPhotoEditLink().href
-    else:
-      url = contact_entry_or_url
+    url = self._GetPhotoUrl(contact_entry_or_url, 'GetPhotoEditLink')
     if url:
       self.Delete(url)
 
-  def GetProfilesFeed(self, uri=None):
+  def GetProfilesFeed(self, uri=None, streaming=False):
     """Retrieves a feed containing all domain's profiles.
 
     Args:
       uri: string (optional) the URL to retrieve the profiles feed,
           for example /m8/feeds/profiles/default/full
+      streaming: boolean (optional) If true, the feed is parsed one entry at
+          a time using gdata.contacts.StreamingProfilesFeedFromString, which
+          uses less memory for large feeds. Streamed feeds are not cached.
 
     Returns:
-      On success, a ProfilesFeed containing the profiles.
+      On success, a ProfilesFeed containing the profiles. An unchanged feed
+      is returned from the cache, as in GetContactsFeed.
       On failure, raises a RequestError.
     """
     
     uri = uri or self.GetFeedUri('profiles')    
-    return self.Get(uri,
-                    converter=gdata.contacts.ProfilesFeedFromString)
+    if streaming:
+      return self.Get(uri,
+                      converter=gdata.contacts.StreamingProfilesFeedFromString)
+    return self._GetCachedFeed(uri, gdata.contacts.ProfilesFeedFromString)
 
   def GetProfile(self, uri):
     """Retrieves a domain's profile for the user.
@@ -302,11 +783,11 @@ class ContactsService(gdata.service.GDataService):
           for example /m8/feeds/profiles/default/full/username
 
     Returns:
-      On success, a ProfileEntry containing the profile for the user.
+      On success, a ProfileEntry containing the profile for the user. An
+      unchanged profile is returned from the cache, as in GetContact.
       On failure, raises a RequestError
     """
-    return self.Get(uri,
-                    converter=gdata.contacts.ProfileEntryFromString)
+    return self._GetCachedEntry(uri, gdata.contacts.ProfileEntryFromString)
 
   def UpdateProfile(self, edit_uri, updated_profile, url_params=None,
                     escape_params=True):
@@ -327,6 +808,7 @@ class ContactsService(gdata.service.GDataService):
         response to the PUT request.
       On failure, raises a RequestError.
     """
+    self.InvalidateCache(edit_uri)
     return self.Put(updated_profile, self._CleanUri(edit_uri),
                     url_params=url_params, escape_params=escape_params,
                     converter=gdata.contacts.ProfileEntryFromString)
@@ -349,6 +831,7 @@ class ContactsService(gdata.service.GDataService):
       The results of the batch request's execution on the server. If the
       default converter is used, this is stored in a ContactsFeed.
     """
+    self._InvalidateFeeds(self._CleanUri(url))
     return self.Post(batch_feed, url, converter=converter)
   
   def ExecuteBatchProfiles(self, batch_feed, url,
@@ -370,6 +853,7 @@ class ContactsService(gdata.service.GDataService):
       The results of the batch request's execution on the server. If the
       default converter is used, this is stored in a ProfilesFeed.
     """
+    self._InvalidateFeeds(self._CleanUri(url))
     return self.Post(batch_feed, url, converter=converter)
 
   def _CleanUri(self, uri):
@@ -382,26 +866,24 @@ class ContactsService(gdata.service.GDataService):
       The given URI without its http://server prefix, if any.
       Keeps the leading slash of the URI.
     """
-    url_prefix = 'http://%s' % self.server
-    if uri.startswith(url_prefix):
-      uri = uri[len(url_prefix):]
+    if _HAS_REMOVEPREFIX:
+      return uri.removeprefix(self._url_prefix)
+    if uri.startswith(self._url_prefix):
+      return uri[self._url_prefix_len:]
     return uri
 
 class ContactsQuery(gdata.service.Query):
 
   def __init__(self, feed=None, text_query=None, params=None,
       categories=None, group=None):
-    self.feed = feed or '/m8/feeds/contacts/default/full'
+    self.feed = feed or _DEFAULT_CONTACTS_FEED
     if group:
       self._SetGroup(group)
     gdata.service.Query.__init__(self, feed=self.feed, text_query=text_query,
         params=params, categories=categories)
 
   def _GetGroup(self):
-    if 'group' in self:
-      return self['group']
-    else:
-      return None
+    return self.get('group')
 
   def _SetGroup(self, group_id):
     self['group'] = group_id
@@ -413,7 +895,7 @@ class GroupsQuery(gdata.service.Query):
 
   def __init__(self, feed=None, text_query=None, params=None,
       categories=None):
-    self.feed = feed or '/m8/feeds/groups/default/full'
+    self.feed = feed or _DEFAULT_GROUPS_FEED
     gdata.service.Query.__init__(self, feed=self.feed, text_query=text_query,
         params=params, categories=categories)
 
@@ -423,6 +905,6 @@ class ProfilesQuery(gdata.service.Query):
 
   def __init__(self, feed=None, text_query=None, params=None,
                categories=None):
-    self.feed = feed or '/m8/feeds/profiles/default/full'
+    self.feed = feed or _DEFAULT_PROFILES_FEED
     gdata.service.Query.__init__(self, feed=self.feed, text_query=text_query,
                                  params=params, categories=categories)
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import socket
+import unittest
+import atom.http
+
+
+class FakeResponse(object):
+
+  def __init__(self, read=True):
+    self.read = read
+
+  def isclosed(self):
+    # httplib closes a response once its body has been read completely.
+    return self.read
+
+
+class FakeConnection(object):
+  """Records requests and fails getresponse when told to."""
+
+  def __init__(self):
+    self.requests = []
+    self.fail = False
+    self.leave_unread = False
+    self.closed = False
+
+  def putrequest(self, operation, url, skip_host=False):
+    self.requests.append(operation)
+
+  def putheader(self, name, value):
+    pass
+
+  def endheaders(self):
+    pass
+
+  def send(self, data):
+    pass
+
+  def getresponse(self):
+    if self.fail:
+      raise socket.error('Connection reset by peer')
+    return FakeResponse(read=not self.leave_unread)
+
+  def close(self):
+    self.closed = True
+
+
+class PersistentHttpClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.connections = []
+    self.leave_unread = False
+    def PrepareConnection(client, url, headers):
+      connection = FakeConnection()
+      connection.leave_unread = self.leave_unread
+      self.connections.append(connection)
+      return connection
+    self.original_prepare = atom.http.ProxiedHttpClient._prepare_connection
+    atom.http.ProxiedHttpClient._prepare_connection = PrepareConnection
+    self.client = atom.http.PersistentHttpClient()
+
+  def tearDown(self):
+    atom.http.ProxiedHttpClient._prepare_connection = self.original_prepare
+
+  def testReusesConnection(self):
+    self.client.request('GET', 'http://example.com/a')
+    self.client.request('GET', 'http://example.com/b')
+    self.assertEquals(1, len(self.connections))
+    self.assertEquals(['GET', 'GET'], self.connections[0].requests)
+
+  def testRetriesGetOnStaleConnection(self):
+    self.client.request('GET', 'http://example.com/a')
+    self.connections[0].fail = True
+    self.assert_(self.client.request('GET', 'http://example.com/a'))
+    self.assertEquals(2, len(self.connections))
+    self.assert_(self.connections[0].closed)
+    self.assertEquals(['GET'], self.connections[1].requests)
+
+  def testDoesNotRetryPost(self):
+    self.client.request('GET', 'http://example.com/a')
+    self.connections[0].fail = True
+    self.assertRaises(socket.error, self.client.request, 'POST',
+                      'http://example.com/a', data='<entry/>')
+    self.assertEquals(1, len(self.connections))
+    self.assert_(self.connections[0].closed)
+
+    self.client.request('POST', 'http://example.com/a', data='<entry/>')
+    self.assertEquals(2, len(self.connections))
+    self.assertEquals(['POST'], self.connections[1].requests)
+
+  def testUnreadResponseIsNotReused(self):
+    self.leave_unread = True
+    self.client.request('GET', 'http://example.com/a')
+    self.client.request('POST', 'http://example.com/a', data='<entry/>')
+    self.assertEquals(2, len(self.connections))
+    self.assert_(self.connections[0].closed)
+    self.assertEquals(['GET'], self.connections[0].requests)
+    self.assertEquals(['POST'], self.connections[1].requests)
+
+  def testCloseClosesConnections(self):
+    self.client.request('GET', 'http://example.com/a')
+    self.client.request('GET', 'http://example.org/a')
+    self.client.close()
+    self.assert_(self.connections[0].closed)
+    self.assert_(self.connections[1].closed)
+    self.client.request('GET', 'http://example.com/a')
+    self.assertEquals(3, len(self.connections))
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(PersistentHttpClientTest, 'test'),))
+
+
+if __name__ == '__main__':
+  unittest.main()
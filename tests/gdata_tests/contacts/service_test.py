@@ -17,11 +17,14 @@
 __author__ = 'api.jscudder (Jeff Scudder)'
 
 import getpass
+import io
 import re
 import unittest
 import urllib
 import atom
+import atom.http
 import gdata.contacts.service
+import gdata.service
 import gdata.test_config as conf
 
 
@@ -48,6 +51,14 @@ class ContactsServiceTest(unittest.TestCase):
   def testDefaultContactList(self):
     self.assertEquals('default', self.gd_client.contact_list)
 
+  def testDefaultHttpClientKeepsConnectionsAlive(self):
+    self.assert_(isinstance(self.gd_client.http_client,
+                            atom.http.PersistentHttpClient))
+    client = gdata.contacts.service.ContactsService(
+        http_client=atom.http.HttpClient())
+    self.assert_(not isinstance(client.http_client,
+                                atom.http.PersistentHttpClient))
+
   def testCustomContactList(self):
     if not conf.options.get_value('runlive') == 'true':
       return
@@ -70,6 +81,16 @@ class ContactsServiceTest(unittest.TestCase):
     self.assertEquals(
         'https://www.google.com/m8/feeds/groups/example.com/base/batch', uri)
 
+  def testGetFeedUriAfterChangingServer(self):
+    self.assertEquals('https://www.google.com/m8/feeds/contacts/default/full',
+                      self.gd_client.GetFeedUri(scheme='https'))
+    self.gd_client.server = 'example.com'
+    self.assertEquals('https://example.com/m8/feeds/contacts/default/full',
+                      self.gd_client.GetFeedUri(scheme='https'))
+    self.gd_client.contact_list = 'domain.com'
+    self.assertEquals('/m8/feeds/profiles/domain/domain.com/full',
+                      self.gd_client.GetFeedUri('profiles'))
+
   def testCreateUpdateDeleteContactAndUpdatePhoto(self):
     if not conf.options.get_value('runlive') == 'true':
       return
@@ -186,6 +207,221 @@ class ContactsServiceTest(unittest.TestCase):
     self.assertEquals(batch_result.entry[0].batch_status.code,
                       '201')
 
+  def testCreateContactsSplitsIntoBatches(self):
+    sent = []
+    def ExecuteBatch(batch_feed, url):
+      sent.append((batch_feed, url))
+      return batch_feed
+    self.gd_client.ExecuteBatch = ExecuteBatch
+    contacts = [gdata.contacts.ContactEntry() for i in range(250)]
+
+    result = self.gd_client.CreateContacts(contacts)
+
+    self.assertEquals([100, 100, 50], [len(f.entry) for f, url in sent])
+    self.assertEquals(gdata.contacts.service.DEFAULT_BATCH_URL, sent[0][1])
+    self.assertEquals(250, len(result.entry))
+    self.assertEquals(['0', '100', '249'],
+                      [result.entry[i].batch_id.text for i in (0, 100, 249)])
+    self.assertEquals(gdata.BATCH_INSERT,
+                      result.entry[0].batch_operation.type)
+
+  def testDeleteContactsAcceptsIds(self):
+    sent = []
+    def ExecuteBatch(batch_feed, url):
+      sent.append(batch_feed)
+      return batch_feed
+    self.gd_client.ExecuteBatch = ExecuteBatch
+
+    result = self.gd_client.DeleteContacts(
+        ['http://www.google.com/m8/feeds/contacts/default/base/1'])
+
+    self.assertEquals(1, len(sent))
+    self.assertEquals('http://www.google.com/m8/feeds/contacts/default/base/1',
+                      result.entry[0].id.text)
+    self.assertEquals(gdata.BATCH_DELETE,
+                      result.entry[0].batch_operation.type)
+
+  def testGetPhotoStreamWritesChunks(self):
+    photo = b'x' * 100
+    response = FakeResponse(200, photo)
+    self.gd_client.request = lambda operation, url: response
+    photo_file = io.BytesIO()
+
+    written = self.gd_client.GetPhotoStream(
+        'http://www.google.com/m8/feeds/photos/media/default/1', photo_file,
+        chunk_size=30)
+
+    self.assertEquals(100, written)
+    self.assertEquals(photo, photo_file.getvalue())
+    self.assertEquals([30, 30, 30, 30, 30], response.read_sizes)
+    self.assert_(response.closed)
+
+  def testGetPhotoStreamClosesResponseWhenWriteFails(self):
+    response = FakeResponse(200, b'x' * 100)
+    self.gd_client.request = lambda operation, url: response
+    class BrokenFile(object):
+      def write(self, data):
+        raise IOError('disk full')
+
+    self.assertRaises(IOError, self.gd_client.GetPhotoStream,
+                      '/m8/feeds/photos/media/default/1', BrokenFile())
+    self.assert_(response.closed)
+
+  def testGetPhotoStreamRedirectWithoutLocation(self):
+    requested = []
+    def Request(operation, url):
+      requested.append(url)
+      return FakeResponse(302, b'')
+    self.gd_client.request = Request
+
+    self.assertRaises(gdata.service.RequestError,
+                      self.gd_client.GetPhotoStream,
+                      '/m8/feeds/photos/media/default/1', io.BytesIO())
+    self.assertEquals(['/m8/feeds/photos/media/default/1'], requested)
+
+  def testGetPhotosReturnsEveryPhoto(self):
+    self.gd_client.GetPhoto = lambda url: 'photo of %s' % url
+    urls = ['/photos/%d' % i for i in range(20)]
+
+    photos = dict(self.gd_client.GetPhotos(urls, max_workers=4))
+
+    self.assertEquals(20, len(photos))
+    self.assertEquals('photo of /photos/7', photos['/photos/7'])
+
+  def testGetPhotosRaisesDownloadErrors(self):
+    def GetPhoto(url):
+      raise gdata.service.RequestError({'status': 404, 'reason': 'Not Found',
+                                        'body': ''})
+    self.gd_client.GetPhoto = GetPhoto
+    self.assertRaises(gdata.service.RequestError, list,
+                      self.gd_client.GetPhotos(['/photos/1']))
+
+  def testGetPhotosRequiresAWorker(self):
+    self.assertRaises(ValueError, self.gd_client.GetPhotos, ['/photos/1'],
+                      max_workers=0)
+
+  def testGetPhotoStreamWithoutPhotoLink(self):
+    self.assertEquals(None, self.gd_client.GetPhotoStream(
+        gdata.contacts.ContactEntry(), io.BytesIO()))
+
+  def testChangePhotoWithoutPhotoEditLink(self):
+    self.assertRaises(gdata.contacts.service.Error,
+                      self.gd_client.ChangePhoto, io.BytesIO(b'image'),
+                      gdata.contacts.ContactEntry(),
+                      content_type='image/jpeg', content_length=5)
+
+  def testIterContactsFollowsNextLinks(self):
+    first_page = gdata.contacts.ContactsFeed(
+        entry=[gdata.contacts.ContactEntry(), gdata.contacts.ContactEntry()],
+        link=[atom.Link(rel='next', href='/next/page')])
+    second_page = gdata.contacts.ContactsFeed(
+        entry=[gdata.contacts.ContactEntry()])
+    pages = {'/m8/feeds/contacts/default/full?max-results=2': first_page,
+             '/next/page': second_page}
+    requested = []
+    def Get(uri, converter=None):
+      requested.append(uri)
+      return pages[uri]
+    self.gd_client.Get = Get
+
+    contacts = list(self.gd_client.IterContacts(page_size=2))
+
+    self.assertEquals(3, len(contacts))
+    self.assertEquals(['/m8/feeds/contacts/default/full?max-results=2',
+                       '/next/page'], requested)
+
+  def testGetContactReusesCachedEntryWhenNotModified(self):
+    uri = 'http://www.google.com/m8/feeds/contacts/default/full/1'
+    contact = gdata.contacts.ContactEntry(etag='"abc"')
+    sent_headers = []
+    def Get(uri, extra_headers=None, converter=None):
+      sent_headers.append(extra_headers)
+      if extra_headers:
+        raise gdata.service.RequestError({'status': 304,
+            'reason': 'Not Modified', 'body': ''})
+      return contact
+    self.gd_client.Get = Get
+
+    self.assert_(self.gd_client.GetContact(uri) is contact)
+    self.assert_(self.gd_client.GetContact(uri) is contact)
+    self.assertEquals([None, {'If-None-Match': '"abc"'}], sent_headers)
+
+    self.gd_client.InvalidateCache('/m8/feeds/contacts/default/full/1')
+    self.gd_client.GetContact(uri)
+    self.assertEquals(None, sent_headers[-1])
+
+  def testGetContactSendsETagAsText(self):
+    contact = gdata.contacts.ContactEntryFromString(
+        '<entry xmlns="http://www.w3.org/2005/Atom"'
+        ' xmlns:gd="http://schemas.google.com/g/2005"'
+        ' gd:etag="&quot;abc&quot;"/>')
+    sent_headers = []
+    def Get(uri, extra_headers=None, converter=None):
+      sent_headers.append(extra_headers)
+      return contact
+    self.gd_client.Get = Get
+
+    self.gd_client.GetContact('/m8/feeds/contacts/default/full/1')
+    self.gd_client.GetContact('/m8/feeds/contacts/default/full/1')
+    self.assertEquals({'If-None-Match': '"abc"'}, sent_headers[-1])
+    self.assert_(isinstance(sent_headers[-1]['If-None-Match'], str))
+
+  def testInvalidateCacheByEditUri(self):
+    contact = gdata.contacts.ContactEntry(etag='"abc"', link=[atom.Link(
+        rel='edit',
+        href='http://www.google.com/m8/feeds/contacts/default/full/1/2')])
+    self.gd_client.Get = lambda uri, extra_headers=None, converter=None: (
+        contact)
+
+    self.gd_client.GetContact('/m8/feeds/contacts/default/full/1')
+    self.gd_client.InvalidateCache('/m8/feeds/contacts/default/full/1/2')
+    self.assertEquals(0, len(self.gd_client._entry_cache))
+    self.assertEquals(0, len(self.gd_client._entry_keys))
+
+  def testGetContactsFeedReusesCachedFeedWhenNotModified(self):
+    feed = gdata.contacts.ContactsFeedFromString(
+        '<feed xmlns="http://www.w3.org/2005/Atom"'
+        ' xmlns:gd="http://schemas.google.com/g/2005" gd:etag="W/&quot;x&quot;">'
+        '<updated>2008-03-05T12:36:38.836Z</updated></feed>')
+    sent_headers = []
+    def Get(uri, extra_headers=None, converter=None):
+      sent_headers.append(extra_headers)
+      if extra_headers:
+        raise gdata.service.RequestError({'status': 304,
+            'reason': 'Not Modified', 'body': ''})
+      return feed
+    self.gd_client.Get = Get
+
+    self.assert_(self.gd_client.GetContactsFeed() is feed)
+    self.assert_(self.gd_client.GetContactsFeed() is feed)
+    self.assertEquals([None, {
+        'If-None-Match': 'W/"x"',
+        'If-Modified-Since': 'Wed, 05 Mar 2008 12:36:38 GMT'}], sent_headers)
+
+    self.gd_client.InvalidateCache(
+        '/m8/feeds/contacts/default/full/1/2')
+    self.gd_client.GetContactsFeed()
+    self.assertEquals(None, sent_headers[-1])
+
+  def testGetContactsFeedCachesOnlyRecentFeedsWithETags(self):
+    def Get(uri, extra_headers=None, converter=None):
+      etag = ''
+      if uri.find('max-results') < 0:
+        etag = ' gd:etag="W/&quot;x&quot;"'
+      return gdata.contacts.ContactsFeedFromString(
+          '<feed xmlns="http://www.w3.org/2005/Atom"'
+          ' xmlns:gd="http://schemas.google.com/g/2005"%s>'
+          '<updated>2008-03-05T12:36:38.836Z</updated></feed>' % etag)
+    self.gd_client.Get = Get
+
+    self.gd_client.GetContactsFeed('/feed?max-results=10')
+    self.assertEquals(0, len(self.gd_client._feed_meta))
+    for index in range(gdata.contacts.service.FEED_CACHE_MAX + 1):
+      self.gd_client.GetContactsFeed('/feed?start-index=%d' % index)
+    self.assertEquals(gdata.contacts.service.FEED_CACHE_MAX,
+                      len(self.gd_client._feed_meta))
+    self.assert_('/feed?start-index=0' not in self.gd_client._feed_meta)
+
   def testCleanUriNeedsCleaning(self):
     self.assertEquals('/relative/uri', self.gd_client._CleanUri(
         'http://www.google.com/relative/uri'))
@@ -217,6 +453,14 @@ class ContactsQueryTest(unittest.TestCase):
         '?group=http%3A%2F%2Fgoogle.com%2Fm8%2Ffeeds%2Fgroups'
         '%2Fliz%2540gmail.com%2Ffull%2F270f')
 
+  def testGroupIsAQueryParameter(self):
+    query = gdata.contacts.service.ContactsQuery()
+    self.assertEquals(None, query.group)
+    query = gdata.contacts.service.ContactsQuery(params={'group': 'g1'})
+    self.assertEquals('g1', query.group)
+    query.group = 'g2'
+    self.assertEquals('g2', query['group'])
+
 
 class ContactsGroupsTest(unittest.TestCase):
 
@@ -250,6 +494,27 @@ class ContactsGroupsTest(unittest.TestCase):
 
 
 # Utility methods.
+class FakeResponse(object):
+
+  def __init__(self, status, body, reason='OK', headers=None):
+    self.status = status
+    self.reason = reason
+    self.read_sizes = []
+    self.closed = False
+    self._body = io.BytesIO(body)
+    self._headers = headers or {}
+
+  def read(self, amt=None):
+    self.read_sizes.append(amt)
+    return self._body.read(amt)
+
+  def getheader(self, name, default=None):
+    return self._headers.get(name, default)
+
+  def close(self):
+    self.closed = True
+
+
 def DeleteTestContact(client):
   # Get test contact
   feed = client.GetContactsFeed()
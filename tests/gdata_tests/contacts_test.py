@@ -146,6 +146,33 @@ class ContactsFeedTest(unittest.TestCase):
     self.assert_(isinstance(copied_feed.entry[0], gdata.contacts.ContactEntry))
 
 
+class StreamingContactsFeedTest(unittest.TestCase):
+
+  def testMatchesNonStreamingParse(self):
+    feed = gdata.contacts.ContactsFeedFromString(test_data.CONTACTS_FEED)
+    streamed = gdata.contacts.StreamingContactsFeedFromString(
+        test_data.CONTACTS_FEED)
+    self.assertEquals(streamed.id.text, feed.id.text)
+    self.assertEquals(streamed.total_results.text, '1')
+    self.assertEquals(len(streamed.entry), 1)
+    self.assert_(isinstance(streamed.entry[0], gdata.contacts.ContactEntry))
+    self.assertEquals(streamed.entry[0].GetPhotoLink().href,
+                      feed.entry[0].GetPhotoLink().href)
+    self.assertEquals(streamed.ToString(), feed.ToString())
+
+  def testIgnoresComments(self):
+    xml = test_data.CONTACTS_FEED.replace(
+        '<entry>', '<!-- comment --><?pi data?><entry>', 1)
+    self.assertNotEqual(xml, test_data.CONTACTS_FEED)
+    streamed = gdata.contacts.StreamingContactsFeedFromString(xml)
+    self.assertEquals(streamed.ToString(),
+                      gdata.contacts.ContactsFeedFromString(xml).ToString())
+
+  def testWrongRootElement(self):
+    self.assertEquals(None, gdata.contacts.StreamingContactsFeedFromString(
+        test_data.NEW_CONTACT))
+
+
 class GroupsFeedTest(unittest.TestCase):
 
   def setUp(self):